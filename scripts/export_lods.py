@@ -0,0 +1,25 @@
+import os
+import sys
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.append(ROOT)
+from src.lod_exporter import LODExporter
+
+
+
+
+if __name__ == "__main__":
+
+    exporter = LODExporter(
+        texture_sizes=[4096, 2048, 1024],  # longer side of each texture LOD
+        texture_formats=["jpg", "webp"],
+        mesh_ratios=[0.5, 0.25, 0.1],  # face ratio against mesh.obj
+    )
+
+    root = "/media/jseob/SSD_HEAD/ava256"
+    subj_names = sorted(os.listdir(root))
+    save_dirs = [os.path.join(root, subj_name, "decoder", "results") for subj_name in subj_names]
+
+    # each worker holds one parsed mesh and at most one full atlas, reduce num_workers if memory is short.
+    manifests = exporter.run_all(save_dirs, num_workers=4)
+    failed = [subj_name for subj_name, manifest in zip(subj_names, manifests) if manifest is None]
+    print(f"{len(failed)} / {len(subj_names)} subjects failed : {failed}")
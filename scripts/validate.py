@@ -0,0 +1,26 @@
+import os
+import sys
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.append(ROOT)
+from src.validator import Validator
+
+
+
+
+if __name__ == "__main__":
+
+    validator = Validator(
+        num_samples=1000000,  # mesh vertices to project, None for all
+        min_coverage=0.05,  # cameras seeing less than this fraction of sampled vertices fail the check
+    )
+
+    root = "/media/jseob/SSD_HEAD/ava256"
+    subj_names = sorted(os.listdir(root))
+    failed = []
+    for subj_name in subj_names:
+        save_dir = os.path.join(root, subj_name, "decoder", "results")
+        report = validator.run(save_dir)  # writes save_dir/validation.json
+        if not report["passed"]:
+            failed.append(subj_name)
+
+    print(f"{len(failed)} / {len(subj_names)} subjects failed : {failed}")
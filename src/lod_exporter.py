@@ -0,0 +1,303 @@
+import os
+import json
+import logging
+import numpy as np
+import open3d as o3d
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from src.utils import load_obj
+
+logging.basicConfig(
+    format='%(levelname)s:%(message)s',
+    level=logging.INFO
+)
+
+FORMATS = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def find_textures(obj_path):
+    """
+    Find every diffuse texture (map_Kd) referenced by the OBJ's material library.
+
+    Metashape writes one map_Kd per texture page. Returns an empty list if the mesh has no texture.
+    """
+    obj_dir = os.path.dirname(obj_path)
+    mtl_names = []
+    with open(obj_path, 'r') as obj_file:
+        for line in obj_file:
+            if line.startswith("mtllib"):
+                mtl_names.append(line.split(maxsplit=1)[1].strip())
+            elif line.startswith("v ") or line.startswith("f "):
+                break  # mtllib is written in the header
+
+    texture_paths = []
+    for mtl_name in mtl_names:
+        mtl_path = os.path.join(obj_dir, mtl_name)
+        if not os.path.exists(mtl_path):
+            continue
+        with open(mtl_path, 'r') as mtl_file:
+            for line in mtl_file:
+                if line.strip().startswith("map_Kd"):
+                    texture_paths.append(os.path.join(obj_dir, line.strip().split(maxsplit=1)[1]))
+    return texture_paths
+
+
+def save_obj(obj_path, vertices, triangles, uvs=None, mtl_name=None):
+    with open(obj_path, 'w') as obj_file:
+        if mtl_name is not None:
+            obj_file.write(f"mtllib {mtl_name}\nusemtl material0\n")
+        np.savetxt(obj_file, vertices, fmt="v %.6f %.6f %.6f")
+        if uvs is None:
+            np.savetxt(obj_file, triangles + 1, fmt="f %d %d %d")
+        else:
+            np.savetxt(obj_file, uvs.reshape(-1, 2), fmt="vt %.6f %.6f")
+            corner_ids = np.arange(len(triangles) * 3).reshape(-1, 3)
+            np.savetxt(obj_file, np.stack([triangles + 1, corner_ids + 1], axis=-1).reshape(-1, 6),
+                       fmt="f %d/%d %d/%d %d/%d")
+
+
+def save_mtl(mtl_path, texture_name):
+    with open(mtl_path, 'w') as mtl_file:
+        mtl_file.write("newmtl material0\n")
+        mtl_file.write("Ka 1.0 1.0 1.0\nKd 1.0 1.0 1.0\nKs 0.0 0.0 0.0\n")
+        mtl_file.write(f"map_Kd {texture_name}\n")
+
+
+def compute_charts(triangles, uvs):
+    """
+    Label each triangle with its UV chart.
+
+    Two triangles are in the same chart when they share an edge whose two corners have the same UVs
+    on both sides, i.e. the edge is not a texture seam.
+    """
+    num_faces = len(triangles)
+    quantized = np.round(uvs * (1 << 20)).astype(np.int64)
+    edges = []
+    for i, j in [(0, 1), (1, 2), (2, 0)]:
+        swap = triangles[:, i] > triangles[:, j]
+        v0 = np.where(swap, triangles[:, j], triangles[:, i])
+        v1 = np.where(swap, triangles[:, i], triangles[:, j])
+        uv0 = np.where(swap[:, None], quantized[:, j], quantized[:, i])
+        uv1 = np.where(swap[:, None], quantized[:, i], quantized[:, j])
+        edges.append(np.column_stack([v0, v1, uv0, uv1, np.arange(num_faces)]))
+    edges = np.concatenate(edges)
+    edges = edges[np.lexsort(edges[:, :6].T[::-1])]
+    same = np.all(edges[1:, :6] == edges[:-1, :6], axis=1)
+    face_a, face_b = edges[:-1, 6][same], edges[1:, 6][same]
+
+    # connected components by min-label propagation with pointer jumping
+    labels = np.arange(num_faces)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, face_a, labels[face_b])
+        np.minimum.at(labels, face_b, labels[face_a])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def barycentric(points, a, b, c):
+    # barycentric coordinates of points on the plane of triangles (a, b, c), extrapolated outside the triangle
+    e0, e1, d = b - a, c - a, points - a
+    d00 = np.sum(e0 * e0, axis=-1)
+    d01 = np.sum(e0 * e1, axis=-1)
+    d11 = np.sum(e1 * e1, axis=-1)
+    d20 = np.sum(d * e0, axis=-1)
+    d21 = np.sum(d * e1, axis=-1)
+    denom = d00 * d11 - d01 * d01
+    degenerate = np.abs(denom) < 1e-20
+    denom = np.where(degenerate, 1.0, denom)
+    bv = np.where(degenerate, 1 / 3, (d11 * d20 - d01 * d21) / denom)
+    bw = np.where(degenerate, 1 / 3, (d00 * d21 - d01 * d20) / denom)
+    return np.stack([1 - bv - bw, bv, bw], axis=-1)
+
+
+def transfer_uvs(vertices, triangles, uvs, lod_vertices, lod_triangles):
+    """
+    Carry per-corner UVs from the full mesh onto a decimated mesh. The transfer is approximate.
+
+    Each decimated triangle is assigned the chart of the full-mesh triangle closest to its centroid.
+    Corners whose closest full-mesh triangle is in that chart take the UV of their closest point.
+    Corners in another chart (the triangle straddles a seam) are extrapolated through the centroid triangle's
+    affine UV map, and fall back to their own closest-point UV when that leaves [0, 1].
+    Straddling triangles can still sample atlas padding or a neighbouring chart near seams.
+    """
+    scene = o3d.t.geometry.RaycastingScene()
+    scene.add_triangles(o3d.core.Tensor(vertices.astype(np.float32)),
+                        o3d.core.Tensor(triangles.astype(np.uint32)))
+    charts = compute_charts(triangles, uvs)
+
+    corners = lod_vertices[lod_triangles]  # (T', 3, 3)
+    centroids = corners.mean(axis=1).astype(np.float32)
+    centroid_ids = scene.compute_closest_points(o3d.core.Tensor(centroids))["primitive_ids"].numpy().astype(np.int64)
+
+    closest = scene.compute_closest_points(o3d.core.Tensor(corners.reshape(-1, 3).astype(np.float32)))
+    corner_ids = closest["primitive_ids"].numpy().astype(np.int64).reshape(-1, 3)
+    corner_points = closest["points"].numpy().astype(np.float64).reshape(-1, 3, 3)
+
+    # UV of each corner's closest point on the full mesh, always inside that point's chart
+    weights = barycentric(corner_points, *[vertices[triangles[corner_ids, i]] for i in range(3)])
+    weights = np.clip(weights, 0.0, 1.0)
+    weights /= np.sum(weights, axis=-1, keepdims=True)
+    closest_uvs = np.einsum('tck,tckd->tcd', weights, uvs[corner_ids])
+
+    # corners extrapolated through the centroid's triangle
+    weights = barycentric(corners, *[vertices[triangles[centroid_ids, i]][:, None, :] for i in range(3)])
+    extrapolated_uvs = np.einsum('tck,tkd->tcd', weights, uvs[centroid_ids])
+
+    in_chart = charts[corner_ids] == charts[centroid_ids][:, None]
+    in_atlas = np.all((extrapolated_uvs >= 0.0) & (extrapolated_uvs <= 1.0), axis=-1)
+    # the centroid may snap to the far side of a thin sheet; trust the corners then.
+    far_side = ~np.any(in_chart, axis=1, keepdims=True)
+    use_closest = in_chart | ~in_atlas | far_side
+    return np.where(use_closest[..., None], closest_uvs, extrapolated_uvs)
+
+
+class LODExporter():
+    def __init__(self,
+                 texture_sizes=[4096, 2048, 1024],  # longer side of each texture LOD
+                 texture_formats=["jpg"],  # among jpg, png, webp
+                 quality=90,  # jpg / webp quality
+                 mesh_ratios=[0.5, 0.25, 0.1],  # face ratio of each mesh LOD against mesh.obj
+                 ):
+        for texture_format in texture_formats:
+            if texture_format not in FORMATS:
+                logging.error(f"{texture_format} is not supported. Choose among {list(FORMATS.keys())}")
+                raise Exception("LOD export stops.")
+
+        self.texture_sizes = sorted(texture_sizes, reverse=True)
+        self.texture_formats = texture_formats
+        self.quality = quality
+        self.mesh_ratios = sorted(mesh_ratios, reverse=True)
+
+    def export_textures(self, texture_path, save_dir):
+        textures = []
+        img = Image.open(texture_path)
+        source_size = img.size
+
+        # levels at or above the source resolution are re-encoded at the source size instead of upscaled.
+        sizes = []
+        for size in self.texture_sizes:
+            if size >= max(source_size):
+                logging.info(f"Texture LOD {size} is not smaller than the {max(source_size)} atlas. Re-encoded at source size.")
+                size = max(source_size)
+            if size not in sizes:
+                sizes.append(size)
+
+        # JPEG atlases are decoded directly at the nearest 1/2, 1/4, 1/8 scale above the largest LOD,
+        # so the full resolution atlas is never held in memory. draft does nothing for other formats.
+        scale = sizes[0] / max(source_size)
+        img.draft("RGB", (int(source_size[0] * scale), int(source_size[1] * scale)))
+        img.load()
+        if img.mode != "RGB":
+            current = img.convert("RGB")
+            img.close()
+        else:
+            current = img  # no extra copy for RGB atlases
+        del img
+
+        for size in sizes:
+            scale = size / max(source_size)
+            target = (max(1, round(source_size[0] * scale)), max(1, round(source_size[1] * scale)))
+
+            # cascade from the previous level so only two levels are alive at once.
+            while current.size[0] >= 2 * target[0] and current.size[1] >= 2 * target[1]:
+                current = current.reduce(2)
+            if current.size != target:
+                current = current.resize(target, Image.LANCZOS)
+
+            for texture_format in self.texture_formats:
+                texture_name = f"texture_{size}.{texture_format}"
+                save_kwargs = {} if texture_format == "png" else {"quality": self.quality}
+                current.save(os.path.join(save_dir, texture_name), FORMATS[texture_format], **save_kwargs)
+                textures.append({"size": list(target), "format": texture_format, "path": texture_name})
+
+        return source_size, textures
+
+    def export_meshes(self, obj_path, save_dir, texture_names=[]):
+        meshes = []
+        # parsed with numpy in chunks, without loading the atlas referenced by the material.
+        vertices, triangles, uvs = load_obj(obj_path)
+        if triangles is None:
+            logging.error(f"{obj_path} has no faces.")
+            raise Exception("LOD export stops.")
+        obj = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(vertices),
+                                        o3d.utility.Vector3iVector(triangles))
+        num_faces = len(triangles)
+
+        for lod_idx, ratio in enumerate(self.mesh_ratios):
+            target_faces = max(1, int(num_faces * ratio))
+            lod = obj.simplify_quadric_decimation(target_number_of_triangles=target_faces)
+            lod.remove_unreferenced_vertices()
+            lod_vertices = np.asarray(lod.vertices)
+            lod_triangles = np.asarray(lod.triangles).astype(np.int64)
+
+            # quadric decimation drops UVs, so they are transferred approximately from the full mesh.
+            mesh_name = f"mesh_lod{lod_idx + 1}.obj"
+            mtl_name = None
+            texture_name = None
+            lod_uvs = None
+            if uvs is not None and len(texture_names) > 0:
+                lod_uvs = transfer_uvs(vertices, triangles, uvs, lod_vertices, lod_triangles)
+                # pair mesh LOD n with texture LOD n, the smallest texture is reused for extra mesh levels.
+                texture_name = texture_names[min(lod_idx, len(texture_names) - 1)]
+                mtl_name = f"mesh_lod{lod_idx + 1}.mtl"
+                save_mtl(os.path.join(save_dir, mtl_name), texture_name)
+
+            save_obj(os.path.join(save_dir, mesh_name), lod_vertices, lod_triangles, lod_uvs, mtl_name)
+            meshes.append({"ratio": ratio,
+                           "faces": len(lod_triangles),
+                           "vertices": len(lod_vertices),
+                           "path": mesh_name,
+                           "mtl": mtl_name,
+                           "texture": texture_name})
+        return num_faces, meshes
+
+    def run(self, save_dir):
+        obj_path = os.path.join(save_dir, "mesh.obj")
+        if not os.path.exists(obj_path):
+            logging.error(f"{obj_path} does not exists.")
+            raise Exception("LOD export stops.")
+
+        manifest = {"mesh": "mesh.obj", "texture": None, "texture_size": None, "texture_pages": 0, "faces": None,
+                    "textures": [], "meshes": []}
+
+        texture_paths = find_textures(obj_path)
+        manifest["texture_pages"] = len(texture_paths)
+        if len(texture_paths) > 1:
+            # a single material per LOD would map every page's UVs onto page 0.
+            logging.error(f"{obj_path} has {len(texture_paths)} texture pages. Texture LODs and mesh UVs are skipped.")
+        elif len(texture_paths) == 0 or not os.path.exists(texture_paths[0]):
+            logging.warning(f"No texture is found for {obj_path}. Texture LODs are skipped.")
+        else:
+            texture_path = texture_paths[0]
+            source_size, textures = self.export_textures(texture_path, save_dir)
+            manifest["texture"] = os.path.relpath(texture_path, save_dir)
+            manifest["texture_size"] = list(source_size)
+            manifest["textures"] = textures
+
+        # one texture file per level in the first requested format, used by the mesh LOD materials
+        texture_names = [texture["path"] for texture in manifest["textures"]
+                         if texture["format"] == self.texture_formats[0]]
+        manifest["faces"], manifest["meshes"] = self.export_meshes(obj_path, save_dir, texture_names)
+
+        manifest_path = os.path.join(save_dir, "lods.json")
+        with open(manifest_path, 'w') as json_file:
+            json.dump(manifest, json_file, indent=2)
+        logging.info(f"LODs are exported : {manifest_path}")
+        return manifest
+
+    def run_all(self, save_dirs, num_workers=4):
+        # one subject per worker; each worker holds the parsed mesh arrays (positions, triangles, per-corner UVs)
+        # plus the decimation copies and at most one full atlas, so size num_workers by the largest mesh.
+        # a failing subject is logged and returns None so that the others' manifests are kept.
+        manifests = []
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(self.run, save_dir) for save_dir in save_dirs]
+            for save_dir, future in zip(save_dirs, futures):
+                try:
+                    manifests.append(future.result())
+                except Exception as e:
+                    logging.error(f"LOD export failed for {save_dir} : {e}")
+                    manifests.append(None)
+        return manifests
@@ -57,3 +57,72 @@ def make_cam(T_gk, scale=0.05):
 
     camera.colors = o3d.utility.Vector3dVector(camera_colors)
     return camera
+
+
+def _parse_rows(lines, dtype):
+    # bulk parse "<tag> a b c ..." lines into one 2D array, tag and "/" separators dropped.
+    tag = lines[0].split()[0]
+    cols = len(lines[0].replace("/", " ").split()) - 1
+    values = np.fromstring(" ".join(line[len(tag):] for line in lines).replace("/", " "), dtype=dtype, sep=" ")
+    if values.size != cols * len(lines):
+        raise Exception(f"ERROR : obj \"{tag}\" rows have inconsistent lengths (e.g. non-triangle faces).")
+    return values.reshape(-1, cols)
+
+
+def load_obj(obj_path, vertices_only=False, chunk_bytes=1 << 24):
+    """
+    Read positions, triangles and per-corner UVs from an OBJ without touching its material or texture.
+
+    The file is read in chunks of about chunk_bytes and each chunk is parsed with numpy,
+    so peak memory is the output arrays plus one chunk.
+
+    Returns:
+    --------
+    vertices : (V, 3) ndarray
+    triangles : (T, 3) int ndarray or None
+    uvs : (T, 3, 2) ndarray or None
+        UV of each triangle corner, None if the mesh has no texture coordinates
+    """
+    vertices, texcoords, faces = [], [], []
+    face_format = None
+    with open(obj_path, 'r') as obj_file:
+        while True:
+            lines = obj_file.readlines(chunk_bytes)
+            if len(lines) == 0:
+                break
+
+            v_lines = [line for line in lines if line.startswith("v ")]
+            if len(v_lines) > 0:
+                vertices.append(_parse_rows(v_lines, np.float64)[:, :3])  # skip vertex colors if any
+            if vertices_only:
+                continue
+
+            vt_lines = [line for line in lines if line.startswith("vt ")]
+            if len(vt_lines) > 0:
+                texcoords.append(_parse_rows(vt_lines, np.float64)[:, :2])
+
+            f_lines = [line for line in lines if line.startswith("f ")]
+            if len(f_lines) > 0:
+                if face_format is None:
+                    corner = f_lines[0].split()[1]
+                    face_format = "v//vn" if "//" in corner else ["v", "v/vt", "v/vt/vn"][corner.count("/")]
+                if face_format == "v//vn":
+                    f_lines = [line.replace("//", "/") for line in f_lines]
+                f = _parse_rows(f_lines, np.int64)
+                if f.shape[1] % 3 != 0:
+                    raise Exception(f"ERROR : {obj_path} has a non-triangle face.")
+                faces.append(f.reshape(len(f), 3, -1))
+            del lines
+
+    if len(vertices) == 0:
+        raise Exception(f"ERROR : {obj_path} has no vertices.")
+    vertices = np.concatenate(vertices)
+    if vertices_only or len(faces) == 0:
+        return vertices, None, None
+
+    faces = np.concatenate(faces) - 1  # OBJ is 1-based
+    triangles = faces[..., 0]
+    uvs = None
+    if face_format in ["v/vt", "v/vt/vn"] and len(texcoords) > 0:
+        uvs = np.concatenate(texcoords)[faces[..., 1]]
+    return vertices, triangles, uvs
@@ -0,0 +1,268 @@
+import os
+import json
+import logging
+import numpy as np
+import xml.etree.ElementTree as ET
+from src.utils import apply_T, load_obj
+
+logging.basicConfig(
+    format='%(levelname)s:%(message)s',
+    level=logging.INFO
+)
+
+
+def load_intrinsic_xml(xml_path):
+    """
+    Load a Metashape frame calibration XML into a dict of floats.
+
+    Terms that are absent in the file (e.g. b1, b2, k4) are set to 0.
+    """
+    root = ET.parse(xml_path).getroot()
+    intrinsic = {}
+    for key in ["width", "height", "f", "cx", "cy", "b1", "b2", "k1", "k2", "k3", "k4", "p1", "p2"]:
+        node = root.find(key)
+        if node is None:
+            if key in ["width", "height", "f"]:
+                logging.error(f"{xml_path} has no <{key}>.")
+                raise Exception("Validation stops.")
+            intrinsic[key] = 0.0
+        else:
+            intrinsic[key] = float(node.text)
+    return intrinsic
+
+
+def project_points(points, R_kg, t_kg, intrinsics, near=1e-6):
+    """
+    Project world points into a batch of cameras with Metashape's Brown model.
+
+    Parameters:
+    -----------
+    points : (P, 3) ndarray
+        World points
+    R_kg, t_kg : (B, 3, 3), (B, 3) ndarray
+        World-to-camera rotations and translations
+    intrinsics : dict of (B,) ndarray
+        Stacked calibration terms (see load_intrinsic_xml)
+    near : float
+        Minimum depth for a point to count as in front of the camera
+
+    Returns:
+    --------
+    u, v, z : (B, P) ndarray
+        Distorted pixel coordinates and camera-space depth
+    front : (B, P) bool ndarray
+        Point is deeper than near
+    inside : (B, P) bool ndarray
+        Point is in front of the camera and lands on the image
+    """
+    points_cam = np.einsum('bij,pj->bpi', R_kg, points) + t_kg[:, None, :]
+    z = points_cam[..., 2]
+    front = z > near
+    z_safe = np.where(front, z, 1.0)
+    x = points_cam[..., 0] / z_safe
+    y = points_cam[..., 1] / z_safe
+
+    def term(key):
+        return intrinsics[key][:, None]
+
+    w, h, f = term("width"), term("height"), term("f")
+
+    # reject rays far outside the field of view before distortion, where the polynomial can fold back into the image.
+    u0 = w * 0.5 + term("cx") + x * f
+    v0 = h * 0.5 + term("cy") + y * f
+    in_fov = (u0 >= -0.5 * w) & (u0 < 1.5 * w) & (v0 >= -0.5 * h) & (v0 < 1.5 * h)
+
+    r2 = x * x + y * y
+    radial = 1 + r2 * (term("k1") + r2 * (term("k2") + r2 * (term("k3") + r2 * term("k4"))))
+    p1, p2 = term("p1"), term("p2")
+    xd = x * radial + p1 * (r2 + 2 * x * x) + 2 * p2 * x * y
+    yd = y * radial + p2 * (r2 + 2 * y * y) + 2 * p1 * x * y
+
+    # Metashape keeps the principal point as an offset from the image center.
+    u = w * 0.5 + term("cx") + xd * f + xd * term("b1") + yd * term("b2")
+    v = h * 0.5 + term("cy") + yd * f
+
+    inside = front & in_fov & (u >= 0) & (u < w) & (v >= 0) & (v < h)
+    return u, v, z, front, inside
+
+
+class Validator():
+    def __init__(self,
+                 num_samples=1000000,  # mesh vertices to project, None for all
+                 point_chunk=32768,  # points per batch
+                 camera_chunk=16,  # cameras per batch
+                 grid_size=64,  # silhouette occupancy grid per camera
+                 min_coverage=0.05,  # per-camera fraction of sampled points that must land on the image
+                 seed=0,
+                 ):
+        self.num_samples = num_samples
+        self.point_chunk = point_chunk
+        self.camera_chunk = camera_chunk
+        self.grid_size = grid_size
+        self.min_coverage = min_coverage
+        self.seed = seed
+
+    def load_points(self, obj_path, mesh_coord_changer_path):
+        # vertices only, so the texture atlas referenced by the material is never decoded.
+        vertices, _, _ = load_obj(obj_path, vertices_only=True)
+        mesh_coord_changer = np.load(mesh_coord_changer_path).reshape(4, 4)
+
+        num_vertices = len(vertices)
+
+        if self.num_samples is not None and num_vertices > self.num_samples:
+            rng = np.random.default_rng(self.seed)
+            vertices = vertices[np.sort(rng.choice(num_vertices, self.num_samples, replace=False))]
+
+        # same transform as Visualizer so that mesh and extrinsics share one coordinate system.
+        points = apply_T(mesh_coord_changer, vertices)
+        return points, num_vertices
+
+    def load_rig(self, save_dir):
+        intr_dir = os.path.join(save_dir, "intrinsics")
+        extr_dir = os.path.join(save_dir, "extrinsics")
+
+        labels = []
+        missing = []
+        T_gks = []
+        intrinsic_list = []
+        for extrinsic_name in sorted(os.listdir(extr_dir)):
+            if not extrinsic_name.endswith("_extrinsic.npy"):
+                continue
+            label = extrinsic_name[:-len("_extrinsic.npy")]
+            calib_path = os.path.join(intr_dir, f"{label}_intrinsic.xml")
+            if not os.path.exists(calib_path):
+                logging.warning(f"{label} has no intrinsic file. Skipped.")
+                missing.append(label)
+                continue
+
+            T_gk = np.load(os.path.join(extr_dir, extrinsic_name), allow_pickle=True)
+            if T_gk.size != 16 or not np.all(np.isfinite(T_gk.astype(np.float64))):
+                # cameras Metashape failed to align have no transform.
+                logging.warning(f"{label} has no valid extrinsic. Skipped.")
+                missing.append(label)
+                continue
+
+            labels.append(label)
+            T_gks.append(T_gk.reshape(4, 4).astype(np.float64))
+            intrinsic_list.append(load_intrinsic_xml(calib_path))
+
+        if len(labels) == 0:
+            logging.error(f"No valid camera is found in {save_dir}.")
+            raise Exception("Validation stops.")
+
+        T_kgs = np.linalg.inv(np.stack(T_gks))  # world-to-cam
+        intrinsics = {key: np.asarray([intr[key] for intr in intrinsic_list], dtype=np.float64)
+                      for key in intrinsic_list[0].keys()}
+        return labels, missing, T_kgs, intrinsics
+
+    def run(self, save_dir, report_path=None):
+        obj_path = os.path.join(save_dir, "mesh.obj")
+        mesh_coord_changer_path = os.path.join(save_dir, "mesh_coord_changer.npy")
+        points, num_vertices = self.load_points(obj_path, mesh_coord_changer_path)
+        labels, missing, T_kgs, intrinsics = self.load_rig(save_dir)
+
+        num_points = len(points)
+        num_cams = len(labels)
+        G = self.grid_size
+        logging.info(f"Validating {num_points} points x {num_cams} cameras")
+
+        # running statistics, bounded by the number of cameras and sampled points
+        num_front = np.zeros(num_cams, dtype=np.int64)
+        num_inside = np.zeros(num_cams, dtype=np.int64)
+        depth_sum = np.zeros(num_cams)
+        depth_sq_sum = np.zeros(num_cams)
+        depth_min = np.full(num_cams, np.inf)
+        depth_max = np.full(num_cams, -np.inf)
+        bbox_min = np.full((num_cams, 2), np.inf)
+        bbox_max = np.full((num_cams, 2), -np.inf)
+        occupancy = np.zeros((num_cams, G, G), dtype=bool)
+        frustum_count = np.zeros(num_points, dtype=np.int32)
+
+        for cam_start in range(0, num_cams, self.camera_chunk):
+            cams = slice(cam_start, min(cam_start + self.camera_chunk, num_cams))
+            R_kg = T_kgs[cams, :3, :3]
+            t_kg = T_kgs[cams, :3, -1]
+            batch_intrinsics = {key: value[cams] for key, value in intrinsics.items()}
+            w = batch_intrinsics["width"][:, None]
+            h = batch_intrinsics["height"][:, None]
+            cam_ids = np.arange(cams.start, cams.stop)[:, None]
+
+            for point_start in range(0, num_points, self.point_chunk):
+                pts = slice(point_start, min(point_start + self.point_chunk, num_points))
+                u, v, z, front, inside = project_points(points[pts], R_kg, t_kg, batch_intrinsics)
+
+                num_front[cams] += front.sum(axis=1)
+                num_inside[cams] += inside.sum(axis=1)
+                frustum_count[pts] += inside.sum(axis=0).astype(np.int32)
+
+                z_in = np.where(inside, z, 0.0)
+                depth_sum[cams] += z_in.sum(axis=1)
+                depth_sq_sum[cams] += (z_in * z_in).sum(axis=1)
+                depth_min[cams] = np.minimum(depth_min[cams], np.where(inside, z, np.inf).min(axis=1))
+                depth_max[cams] = np.maximum(depth_max[cams], np.where(inside, z, -np.inf).max(axis=1))
+
+                bbox_min[cams, 0] = np.minimum(bbox_min[cams, 0], np.where(inside, u, np.inf).min(axis=1))
+                bbox_min[cams, 1] = np.minimum(bbox_min[cams, 1], np.where(inside, v, np.inf).min(axis=1))
+                bbox_max[cams, 0] = np.maximum(bbox_max[cams, 0], np.where(inside, u, -np.inf).max(axis=1))
+                bbox_max[cams, 1] = np.maximum(bbox_max[cams, 1], np.where(inside, v, -np.inf).max(axis=1))
+
+                # mark coarse silhouette cells hit by projected points
+                gx = np.clip((u / w * G).astype(np.int64), 0, G - 1)
+                gy = np.clip((v / h * G).astype(np.int64), 0, G - 1)
+                cells = (np.broadcast_to(cam_ids, inside.shape) * G + gy) * G + gx
+                occupancy.reshape(-1)[cells[inside]] = True
+
+        cameras = {}
+        failed = []
+        for i, label in enumerate(labels):
+            n = int(num_inside[i])
+            coverage = n / num_points
+            camera = {
+                "width": int(intrinsics["width"][i]),
+                "height": int(intrinsics["height"][i]),
+                "num_front": int(num_front[i]),
+                "num_inside": n,
+                "coverage": coverage,
+                "depth": None,
+                "silhouette": None,
+            }
+            if n > 0:
+                mean = depth_sum[i] / n
+                std = np.sqrt(max(depth_sq_sum[i] / n - mean * mean, 0.0))
+                camera["depth"] = {"min": float(depth_min[i]), "max": float(depth_max[i]),
+                                   "mean": float(mean), "std": float(std)}
+                camera["silhouette"] = {"bbox": [float(bbox_min[i, 0]), float(bbox_min[i, 1]),
+                                                 float(bbox_max[i, 0]), float(bbox_max[i, 1])],
+                                        "area_ratio": float(occupancy[i].mean())}
+            cameras[label] = camera
+            if coverage < self.min_coverage:
+                failed.append(label)
+
+        report = {
+            "save_dir": save_dir,
+            "num_mesh_vertices": int(num_vertices),
+            "num_points": int(num_points),
+            "num_cameras": num_cams,
+            # frustum test only, occlusion is not checked
+            "point_frustum_coverage": {
+                "in_no_frustum": float(np.mean(frustum_count == 0)),
+                "in_one_frustum": float(np.mean(frustum_count == 1)),
+                "in_multi_frustum": float(np.mean(frustum_count >= 2)),
+            },
+            "min_coverage": self.min_coverage,
+            "missing_cameras": missing,
+            "failed_cameras": failed,
+            "passed": len(failed) == 0 and len(missing) == 0,
+            "cameras": cameras,
+        }
+
+        if report_path is None:
+            report_path = os.path.join(save_dir, "validation.json")
+        with open(report_path, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+        if report["passed"]:
+            logging.info(f"Validation passed : {report_path}")
+        else:
+            logging.warning(f"Validation failed ({len(failed)} low-coverage, {len(missing)} missing cameras) : {report_path}")
+        return report